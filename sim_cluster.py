@@ -0,0 +1,322 @@
+import argparse
+import json
+import socket
+import socketserver
+import threading
+from collections import (
+    OrderedDict,
+    defaultdict,
+    deque,
+)
+from typing import (
+    Dict,
+    Optional,
+    Tuple,
+)
+
+from sim_game import (
+    JOB_PARAMETERS,
+    SimGame,
+    add_job_arguments,
+    run_job,
+)
+from the_game.stats import OutcomeStats
+
+
+class Coordinator(object):
+    """Hands out seed ranges of a sweep to workers over TCP and merges their results
+
+    The sweep is split into chunks of chunk_size consecutive seeds. Workers pull
+    one chunk at a time, so faster workers simply take more of them. Once every
+    chunk has been handed out, idle workers steal chunks that are still in flight
+    elsewhere; the first result for a chunk is kept and any later duplicate is
+    dropped, which also covers workers that disconnect mid-chunk. Since seeds fix
+    each game, the merged result matches a single SimGame run over the same seeds.
+
+    Messages are one JSON object per line. A worker sends {"type": "request"},
+    {"type": "result", "job_id": ..., **stats} or {"type": "error", "job_id": ..., "error": ...}
+    and is answered with either {"type": "job", **job_spec} or {"type": "done"}. Bad
+    parameters are caught at startup, so a failed chunk is most likely a problem on one
+    node: it goes back to the front of the queue, and only max_failures failures of the
+    same chunk stop the run. Errors for chunks that already have a result are ignored.
+    """
+
+    def __init__(
+        self,
+        n_games: int,
+        seed_start: int = 0,
+        chunk_size: int = 1000,
+        params: Optional[Dict] = None,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        max_failures: int = 3,
+    ):
+        self.params = params or {}
+        self.check_params(seed_start)
+        # chunk specs are built as they are handed out so memory does not grow with
+        # n_games; only the chunks in flight are held
+        self.n_games = n_games
+        self.seed_start = seed_start
+        self.chunk_size = chunk_size
+        self.n_chunks = -(-n_games // chunk_size)
+        self.next_chunk = 0
+        self.retry = deque()
+        self.max_failures = max_failures
+        self.failures = defaultdict(int)
+        self.in_flight = OrderedDict()
+        self.stats = OutcomeStats()
+        self.lock = threading.Lock()
+        self.finished = threading.Event()
+        self.error = None
+        if self.n_chunks == 0:
+            self.finished.set()
+
+        self.server = _CoordinatorServer((host, port), _CoordinatorHandler)
+        self.server.coordinator = self
+
+    def check_params(self, seed_start: int):
+        """Play one game with the sweep's parameters so bad ones fail here, not on every worker"""
+        sim = SimGame(**{k: v for k, v in self.params.items() if k in JOB_PARAMETERS})
+        try:
+            sim.sim_single_game(sim.get_new_game(seed_start))
+        except Exception as e:
+            raise ValueError(f"Invalid job parameters {self.params}: {type(e).__name__}: {e}") from e
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self.server.server_address[:2]
+
+    def chunk_spec(self, job_id: int) -> Dict:
+        offset = job_id * self.chunk_size
+        return {
+            'job_id': job_id,
+            'seed_start': self.seed_start + offset,
+            'n_games': min(self.chunk_size, self.n_games - offset),
+            **self.params,
+        }
+
+    def next_job(self) -> Optional[Dict]:
+        with self.lock:
+            if self.error is not None:
+                return None
+
+            if self.retry:
+                job = self.chunk_spec(self.retry.popleft())
+                self.in_flight[job['job_id']] = job
+                return job
+
+            if self.next_chunk < self.n_chunks:
+                job = self.chunk_spec(self.next_chunk)
+                self.next_chunk += 1
+                self.in_flight[job['job_id']] = job
+                return job
+
+            if self.in_flight:
+                # steal the chunk that has been out the longest and move it to the
+                # back so that several idle workers spread out over the stragglers
+                job_id, job = self.in_flight.popitem(last=False)
+                self.in_flight[job_id] = job
+                return job
+
+            return None
+
+    def complete_job(self, result: Dict):
+        # parse before taking the chunk out of in_flight, so a bad result leaves the
+        # chunk to be run again rather than lost
+        stats = OutcomeStats.from_dict(result)
+        with self.lock:
+            job_id = result['job_id']
+            if job_id in self.in_flight:
+                self.stats.merge(stats)
+                del self.in_flight[job_id]
+            elif job_id in self.retry:
+                # a stolen copy finished after another copy failed
+                self.stats.merge(stats)
+                self.retry.remove(job_id)
+            else:
+                return  # chunk was stolen and has already been merged
+
+            if self.next_chunk == self.n_chunks and not self.in_flight and not self.retry:
+                self.finished.set()
+
+    def fail_job(self, message: Dict):
+        with self.lock:
+            job_id = message['job_id']
+            if job_id not in self.in_flight:
+                return  # a stolen copy failed after the chunk was merged or requeued
+
+            self.failures[job_id] += 1
+            if self.failures[job_id] >= self.max_failures:
+                if self.error is None:
+                    self.error = message
+                self.finished.set()
+                return
+
+            del self.in_flight[job_id]
+            self.retry.appendleft(job_id)
+
+    def run(self, timeout: Optional[float] = None) -> OutcomeStats:
+        """Serve workers until every chunk has a result and return the merged stats
+
+        Raises RuntimeError if a chunk fails max_failures times.
+        """
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            if not self.finished.wait(timeout):
+                raise TimeoutError("Sweep did not finish before the timeout")
+        finally:
+            self.server.shutdown()
+            self.server.server_close()
+
+        if self.error is not None:
+            raise RuntimeError(
+                f"Chunk {self.error.get('job_id')} failed {self.max_failures} times: "
+                f"{self.error.get('error')}"
+            )
+
+        return self.stats
+
+
+class _CoordinatorServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+class _CoordinatorHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        coordinator = self.server.coordinator
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                if message['type'] == 'result':
+                    coordinator.complete_job(message)
+                elif message['type'] == 'error':
+                    coordinator.fail_job(message)
+            except (ValueError, TypeError, KeyError, AttributeError):
+                pass  # drop the malformed message, its chunk stays in flight
+
+            job = coordinator.next_job()
+            if job is None:
+                reply = {'type': 'done'}
+            else:
+                reply = {'type': 'job', **job}
+            self.wfile.write((json.dumps(reply) + '\n').encode())
+
+            if job is None:
+                return
+
+
+def run_node(host: str = '127.0.0.1', port: int = 5555) -> int:
+    """Pull jobs from a coordinator until it has none left, returning how many succeeded"""
+    sims = {}
+    n_jobs = 0
+    with socket.create_connection((host, port)) as sock, sock.makefile('rw') as conn:
+        message = {'type': 'request'}
+        while True:
+            try:
+                conn.write(json.dumps(message) + '\n')
+                conn.flush()
+                line = conn.readline()
+            except OSError:
+                # the coordinator exits as soon as the last chunk is merged, so a
+                # worker still running a stolen copy finds the connection closed
+                line = ''
+            if not line:
+                break  # coordinator went away
+
+            reply = json.loads(line)
+            if reply['type'] == 'done':
+                break
+
+            job = {k: v for k, v in reply.items() if k != 'type'}
+            try:
+                message = {'type': 'result', **run_job(job, sims)}
+                n_jobs += 1
+            except Exception as e:
+                message = {
+                    'type': 'error',
+                    'job_id': job.get('job_id'),
+                    'error': f'{type(e).__name__}: {e}',
+                }
+
+    return n_jobs
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        'mode',
+        choices=['coordinator', 'worker'],
+    )
+    parser.add_argument(
+        '--host',
+        action='store',
+        type=str,
+        default='127.0.0.1',
+        required=False
+    )
+    parser.add_argument(
+        '--port',
+        action='store',
+        type=int,
+        default=5555,
+        required=False
+    )
+    parser.add_argument(
+        '--n_games',
+        action='store',
+        type=int,
+        default=100,
+        required=False
+    )
+    parser.add_argument(
+        '--seed',
+        action='store',
+        type=int,
+        default=0,
+        required=False
+    )
+    parser.add_argument(
+        '--chunk_size',
+        action='store',
+        type=int,
+        default=1000,
+        required=False
+    )
+    parser.add_argument(
+        '--timeout',
+        action='store',
+        type=float,
+        default=None,
+        required=False,
+        help='seconds the coordinator waits for the sweep before giving up'
+    )
+    parser.add_argument(
+        '--max_failures',
+        action='store',
+        type=int,
+        default=3,
+        required=False,
+        help='failures of the same chunk before the coordinator stops the sweep'
+    )
+    add_job_arguments(parser)
+    args = parser.parse_args()
+
+    if args.mode == 'worker':
+        n_jobs = run_node(args.host, args.port)
+        print(f"Completed {n_jobs} jobs")
+    else:
+        coordinator = Coordinator(
+            args.n_games,
+            seed_start=args.seed,
+            chunk_size=args.chunk_size,
+            params={k: getattr(args, k) for k in JOB_PARAMETERS},
+            host=args.host,
+            port=args.port,
+            max_failures=args.max_failures,
+        )
+        print(f"Coordinator listening on {coordinator.address[0]}:{coordinator.address[1]}")
+        stats = coordinator.run(timeout=args.timeout)
+        print(stats.summary())
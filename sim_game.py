@@ -1,16 +1,66 @@
 import argparse
+import inspect
 import json
 import logging
+import sys
+from contextlib import contextmanager
+from typing import (
+    Dict,
+    Iterator,
+    Optional,
+    TextIO,
+)
 
 from the_game.exceptions import NoValidMoveError
 from the_game.game import Game
+from the_game.stats import (
+    GameOutcome,
+    OutcomeStats,
+)
 
 
-logger = logging.getLogger('sim_game_logger')
-logger.setLevel(logging.INFO)
-fh = logging.FileHandler('sim.log')
-fh.setLevel(logging.INFO)
-logger.addHandler(fh)
+LOGGER_NAME = 'sim_game_logger'
+
+# no handlers are attached here so that importing this module stays side-effect
+# free; use get_logger to get a logger that actually writes somewhere
+logger = logging.getLogger(LOGGER_NAME)
+
+
+def get_logger(log_path: str = 'sim.log') -> logging.Logger:
+    """Return a logger writing game events to log_path, opening the file on first use"""
+    file_logger = logging.getLogger(f'{LOGGER_NAME}.{log_path}')
+    if not file_logger.handlers:
+        file_logger.setLevel(logging.INFO)
+        file_logger.propagate = False
+        fh = logging.FileHandler(log_path)
+        fh.setLevel(logging.INFO)
+        file_logger.addHandler(fh)
+
+    return file_logger
+
+
+@contextmanager
+def open_job_logger(log_path: Optional[str] = None) -> Iterator[logging.Logger]:
+    """Yield a logger writing to log_path for the length of one job, closing the file afterwards
+
+    Workers see a new output path for nearly every job, so unlike get_logger the file
+    handler is not kept around. With no log_path the quiet module logger is yielded.
+    """
+    if log_path is None:
+        yield logger
+        return
+
+    job_logger = logging.getLogger(f'{LOGGER_NAME}.job')
+    job_logger.setLevel(logging.INFO)
+    job_logger.propagate = False
+    fh = logging.FileHandler(log_path)
+    fh.setLevel(logging.INFO)
+    job_logger.addHandler(fh)
+    try:
+        yield job_logger
+    finally:
+        job_logger.removeHandler(fh)
+        fh.close()
 
 
 class SimGame(object):
@@ -21,35 +71,97 @@ class SimGame(object):
         player_style: str = 'optimized',
         first_move_selection = 'optimized',
         n_players: int = 3,
-        n_cards: int = 6
+        n_cards: int = 6,
+        seed: Optional[int] = None,
+        logger: Optional[logging.Logger] = None,
     ):
-        self.logger = logger
+        self.logger = logger if logger is not None else logging.getLogger(LOGGER_NAME)
+        self.seed = seed
         self.n_games = n_games
         self.player_style = player_style
         self.n_players = n_players
         self.n_cards = n_cards
         self.first_move_selection = first_move_selection
 
-    def get_new_game(self):
+    def get_new_game(self, deck_seed: Optional[int] = None):
         return Game(self.n_players, 
             self.n_cards,
-            logger,
+            self.logger,
+            deck_seed=deck_seed,
             player_style=self.player_style,
             first_move_selection=self.first_move_selection
         )
 
+    def iter_outcomes(
+        self,
+        n_games: Optional[int] = None,
+        seed_start: Optional[int] = None
+    ) -> Iterator[GameOutcome]:
+        """Lazily play n_games games, yielding a compact GameOutcome for each one
+
+        Deck seeds are consecutive from seed_start (or self.seed) so a run can be
+        split into seed ranges. Nothing is kept between games, so memory use is
+        flat however many games are played.
+        """
+        n_games = self.n_games if n_games is None else n_games
+        seed_start = self.seed if seed_start is None else seed_start
+        for game_num in range(n_games):
+            deck_seed = None if seed_start is None else seed_start + game_num
+            game = self.get_new_game(deck_seed)
+            yield GameOutcome.from_game_over(self.sim_single_game(game))
 
-    def run_sim(self):
-        for game_num in range(self.n_games):
+    def run_sim(self) -> OutcomeStats:
+        stats = OutcomeStats()
+        for game_num, outcome in enumerate(self.iter_outcomes()):
             if game_num % 100 == 0:
                 print(f"Completed {game_num} of {self.n_games}")
-            
-            game = self.get_new_game()
-            self.sim_single_game(game)
 
-    def sim_single_game(self, game: Game):
+            stats.add(outcome)
+
+        return stats
+
+    def sim_single_game(self, game: Game) -> Dict:
         game.setup_game()
 
+        # as in Game.log_move, skip serialising when the logger would drop the records
+        log_enabled = self.logger.isEnabledFor(logging.INFO)
+        if log_enabled:
+            self.log_start_game(game)
+
+        n_turns = 0
+        while not game.game_won:
+            try:
+                game.make_move()
+                n_turns += 1
+            except NoValidMoveError:
+                n_cards_remaining = sum([
+                    len(game.deck), 
+                    sum([len(p.hand) for p in game.players.values()])
+                ])
+
+                game_over = {
+                    'game_event': 'game_over', 
+                    'game_won': False,
+                    'cards_remaining': n_cards_remaining,
+                    'cards_in_deck_remaining': len(game.deck),
+                    'n_turns': n_turns,
+                }
+                if log_enabled:
+                    self.logger.info(json.dumps(game_over))
+
+                return game_over
+
+        game_over = {
+            'game_event': 'game_over', 
+            'game_won': True,
+            'cards_remaining': 0,
+            'n_turns': n_turns,
+        }
+        if log_enabled:
+            self.logger.info(json.dumps(game_over))
+        return game_over
+
+    def log_start_game(self, game: Game):
         player_cards = {
             player_id: sorted(player.hand)
             for player_id, player in game.players.items()
@@ -66,36 +178,76 @@ class SimGame(object):
             'starting_cards': player_cards
         }
 
-        logger.info(json.dumps(log_body))
+        self.logger.info(json.dumps(log_body))
 
-        while not game.game_won:
-            try:
-                game.make_move()
-            except NoValidMoveError:
-                n_cards_remaining = sum([
-                    len(game.deck), 
-                    sum([len(p.hand) for p in game.players.values()])
-                ])
 
-                logger.info(
-                    json.dumps({
-                        'game_event': 'game_over', 
-                        'game_won': False,
-                        'cards_remaining': n_cards_remaining,
-                        'cards_in_deck_remaining': len(game.deck),
-                    })
-                )
-
-                return
-
-        logger.info(
-            json.dumps({
-                'game_event': 'game_over', 
-                'game_won': True,
-                'cards_remaining': 0
-            })
+JOB_PARAMETERS = ('player_style', 'first_move_selection', 'n_players', 'n_cards')
+
+
+def add_job_arguments(parser: argparse.ArgumentParser):
+    """Add a --<name> option for each of JOB_PARAMETERS, typed and defaulted from SimGame"""
+    sim_params = inspect.signature(SimGame).parameters
+    for name in JOB_PARAMETERS:
+        default = sim_params[name].default
+        parser.add_argument(
+            f'--{name}',
+            action='store',
+            type=type(default),
+            default=default,
+            required=False
         )
-        return 
+
+
+def run_job(job: Dict, sims: Dict) -> Dict:
+    """Run a single worker job spec and return a summary of its games
+
+    A job looks like {"job_id": 1, "seed_start": 0, "n_games": 100, "output": "sim.log", ...}
+    plus any of the SimGame parameters. SimGame instances are cached in sims keyed on
+    their parameters so a worker reuses them across jobs, while the output log is only
+    open while the job runs.
+    """
+    if not isinstance(job, dict):
+        raise TypeError(f"Job spec must be a JSON object, got {type(job).__name__}")
+
+    params = {k: job[k] for k in JOB_PARAMETERS if k in job}
+    key = tuple(sorted(params.items()))
+    if key not in sims:
+        sims[key] = SimGame(**params)
+    sim = sims[key]
+
+    stats = OutcomeStats()
+    with open_job_logger(job.get('output')) as job_logger:
+        sim.logger = job_logger
+        for outcome in sim.iter_outcomes(job.get('n_games', 100), job.get('seed_start')):
+            stats.add(outcome)
+
+    return {'job_id': job.get('job_id'), **stats.to_dict()}
+
+
+def run_worker(infile: Optional[TextIO] = None, outfile: Optional[TextIO] = None):
+    """Read one JSON job spec per line from infile and write one JSON result per line to outfile
+
+    The process stays alive until infile is closed, so callers only pay interpreter
+    startup and imports once for many short jobs. infile and outfile default to
+    sys.stdin and sys.stdout as they are when the worker starts.
+    """
+    infile = sys.stdin if infile is None else infile
+    outfile = sys.stdout if outfile is None else outfile
+    sims = {}
+    for line in infile:
+        if not line.strip():
+            continue
+        job = None
+        try:
+            job = json.loads(line)
+            result = run_job(job, sims)
+        except Exception as e:
+            # one bad job must not take the rest of the stream down with it
+            result = {'error': f'{type(e).__name__}: {e}'}
+            if isinstance(job, dict):
+                result['job_id'] = job.get('job_id')
+        outfile.write(json.dumps(result) + '\n')
+        outfile.flush()
 
 
 if __name__ == '__main__':
@@ -107,41 +259,37 @@ if __name__ == '__main__':
         default=100, 
         required=False,
     )
+    add_job_arguments(parser)
     parser.add_argument(
-        '--player_style', 
-        action='store', 
-        type=str, 
-        default='optimized', 
-        required=False,
-    )
-    parser.add_argument(
-        '--n_players', 
+        '--seed',
         action='store',
         type=int,
-        default=3,
+        default=None,
         required=False
     )
     parser.add_argument(
-        '--n_cards', 
+        '--log_path',
         action='store',
         type=str,
-        default=6,
+        default='sim.log',
         required=False
     )
     parser.add_argument(
-        '--first_move_selection', 
-        action='store', 
-        type=str,
-        default='optimized', 
-        required=False
+        '--worker',
+        action='store_true',
+        help='read JSON job specs from stdin and stream JSON results to stdout'
     )
     args = parser.parse_args()
 
+    if args.worker:
+        run_worker()
+        sys.exit(0)
+
     sim = SimGame(
         n_games=args.n_games, 
-        player_style=args.player_style, 
-        first_move_selection=args.first_move_selection,
-        n_players=args.n_players,
-        n_cards=args.n_cards
+        seed=args.seed,
+        logger=get_logger(args.log_path),
+        **{k: getattr(args, k) for k in JOB_PARAMETERS}
     )
-    sim.run_sim()
+    stats = sim.run_sim()
+    print(stats.summary())
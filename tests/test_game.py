@@ -1,3 +1,12 @@
+import argparse
+import io
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
 import unittest
 import pytest
 
@@ -7,7 +16,22 @@ from the_game.exceptions import NoValidMoveError
 from the_game.game import Game
 from the_game.move import Move
 from the_game.player import Player
-from sim_game import SimGame
+from the_game.stats import (
+    GameOutcome,
+    Histogram,
+    OutcomeStats,
+)
+from sim_cluster import (
+    Coordinator,
+    run_node,
+)
+from sim_game import (
+    JOB_PARAMETERS,
+    LOGGER_NAME,
+    SimGame,
+    add_job_arguments,
+    run_worker,
+)
 
 
 def test_deal_1_player():
@@ -277,3 +301,340 @@ def test_sim_game():
     )
 
     assert sg.get_new_game().first_move_selection == 'optimized'
+
+
+def test_sim_game_import_does_not_open_log(tmp_path):
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, 'PYTHONPATH': repo_root}
+    subprocess.run([sys.executable, '-c', 'import sim_game'], cwd=tmp_path, env=env, check=True)
+
+    assert not (tmp_path / 'sim.log').exists()
+    assert logging.getLogger(LOGGER_NAME).handlers == []
+
+
+def test_sim_game_seeded_games_repeat():
+    sg = SimGame(n_games=5, seed=7)
+
+    first = list(sg.iter_outcomes())
+    second = list(sg.iter_outcomes())
+
+    assert len(first) == 5
+    assert first == second
+    assert list(sg.iter_outcomes(n_games=2, seed_start=10)) == first[3:5]
+
+
+def test_run_worker(tmp_path):
+    output = str(tmp_path / 'worker.log')
+    jobs = [
+        {'job_id': 1, 'seed_start': 0, 'n_games': 3, 'n_players': 2, 'output': output},
+        {'job_id': 2, 'seed_start': 0, 'n_games': 3, 'n_players': 2, 'output': output},
+    ]
+    bad_lines = [
+        'not json',
+        '[1]',
+        json.dumps({'job_id': 3, 'seed_start': 0, 'n_games': 1, 'n_cards': 50}),
+    ]
+    lines = [json.dumps(job) for job in jobs] + bad_lines + [json.dumps(jobs[0])]
+    infile = io.StringIO('\n'.join(lines) + '\n')
+    outfile = io.StringIO()
+
+    run_worker(infile, outfile)
+
+    results = [json.loads(line) for line in outfile.getvalue().splitlines()]
+    assert [r.get('job_id') for r in results[:2]] == [1, 2]
+    assert results[0]['n_games'] == 3
+    assert results[0]['games_won'] == results[1]['games_won']
+    assert results[0]['cards_remaining'] == results[1]['cards_remaining']
+    assert all('error' in r for r in results[2:5])
+    assert results[4]['job_id'] == 3
+    assert 'IndexError' in results[4]['error']
+    assert results[5] == results[0]
+    assert (tmp_path / 'worker.log').exists()
+
+
+@pytest.mark.skipif(not os.path.isdir('/proc/self/fd'), reason='needs /proc to count open files')
+def test_run_worker_closes_job_logs(tmp_path):
+    def run_jobs(first_job_id, n_jobs):
+        jobs = [
+            {'job_id': i, 'seed_start': 0, 'n_games': 0, 'output': str(tmp_path / f'job{i}.log')}
+            for i in range(first_job_id, first_job_id + n_jobs)
+        ]
+        infile = io.StringIO('\n'.join(json.dumps(job) for job in jobs) + '\n')
+        outfile = io.StringIO()
+        run_worker(infile, outfile)
+        return [json.loads(line) for line in outfile.getvalue().splitlines()]
+
+    run_jobs(0, 5)
+    n_open = len(os.listdir('/proc/self/fd'))
+    results = run_jobs(5, 70)
+
+    assert len(os.listdir('/proc/self/fd')) == n_open
+    assert not any('error' in r for r in results)
+    assert (tmp_path / 'job74.log').exists()
+
+
+def test_run_worker_reads_current_stdio(monkeypatch):
+    job = {'job_id': 1, 'seed_start': 0, 'n_games': 1}
+    monkeypatch.setattr(sys, 'stdin', io.StringIO(json.dumps(job) + '\n'))
+    stdout = io.StringIO()
+    monkeypatch.setattr(sys, 'stdout', stdout)
+
+    run_worker()
+
+    assert json.loads(stdout.getvalue())['job_id'] == 1
+
+
+def test_sim_single_game_skips_serialising_when_not_logging(monkeypatch):
+    import sim_game
+
+    def fail_dumps(*args, **kwargs):
+        raise AssertionError('json.dumps called with logging disabled')
+
+    monkeypatch.setattr(sim_game.json, 'dumps', fail_dumps)
+    sg = SimGame(n_games=1, seed=0)
+
+    assert sg.sim_single_game(sg.get_new_game(0))['game_event'] == 'game_over'
+
+
+def test_histogram_overflow_bucket():
+    h = Histogram(max_value=3)
+    for value in [0, 1, 1, 3, 4, 10]:
+        h.add(value)
+
+    assert h.to_list() == [1, 2, 0, 1, 2]
+    assert h.n == 6
+    assert h.mean == 19 / 6
+
+
+def test_outcome_stats_merge():
+    outcomes = [GameOutcome(True, 0, 40), GameOutcome(False, 12, 30), GameOutcome(False, 5, 35)]
+
+    combined = OutcomeStats()
+    for outcome in outcomes:
+        combined.add(outcome)
+
+    left, right = OutcomeStats(), OutcomeStats()
+    left.add(outcomes[0])
+    for outcome in outcomes[1:]:
+        right.add(outcome)
+
+    assert left.merge(right).to_dict() == combined.to_dict()
+    assert combined.games_won == 1
+    assert combined.cards_remaining.mean == 17 / 3
+
+    with pytest.raises(ValueError):
+        Histogram(3).merge(Histogram(4))
+
+
+def test_outcome_stats_summary():
+    stats = OutcomeStats()
+    stats.add(GameOutcome(True, 0, 40))
+    stats.add(GameOutcome(False, 10, 30))
+
+    assert stats.summary().splitlines() == [
+        'Won 1 of 2 games (50.00%)',
+        'Mean cards remaining: 5.00',
+        'Mean turns per game: 35.00',
+    ]
+
+
+def test_add_job_arguments():
+    parser = argparse.ArgumentParser()
+    add_job_arguments(parser)
+
+    defaults = vars(parser.parse_args([]))
+    assert set(defaults) == set(JOB_PARAMETERS)
+    assert defaults['n_cards'] == SimGame().n_cards
+    assert parser.parse_args(['--n_cards', '5']).n_cards == 5
+
+
+def test_run_sim_returns_stats():
+    sg = SimGame(n_games=4, n_players=2, seed=0)
+    stats = sg.run_sim()
+
+    assert stats.n_games == 4
+    assert sum(stats.cards_remaining.to_list()) == 4
+    assert stats.n_turns.mean > 0
+
+
+def test_coordinator_steals_in_flight_chunks():
+    coordinator = Coordinator(5, chunk_size=3)
+    try:
+        first = coordinator.next_job()
+        second = coordinator.next_job()
+        assert (first['seed_start'], first['n_games']) == (0, 3)
+        assert (second['seed_start'], second['n_games']) == (3, 2)
+
+        stolen = coordinator.next_job()
+        assert stolen['job_id'] == first['job_id']
+
+        result = {'job_id': first['job_id'], **OutcomeStats().to_dict()}
+        result['n_games'] = 3
+        coordinator.complete_job(result)
+        coordinator.complete_job(result)
+        assert coordinator.stats.n_games == 3
+        assert coordinator.next_job()['job_id'] == second['job_id']
+        assert not coordinator.finished.is_set()
+    finally:
+        coordinator.server.server_close()
+
+
+def test_coordinator_builds_chunks_lazily():
+    coordinator = Coordinator(10 ** 9, chunk_size=1000)
+    try:
+        assert coordinator.n_chunks == 10 ** 6
+        assert coordinator.in_flight == {}
+
+        coordinator.next_job()
+        last = coordinator.chunk_spec(coordinator.n_chunks - 1)
+        assert len(coordinator.in_flight) == 1
+        assert (last['seed_start'], last['n_games']) == (10 ** 9 - 1000, 1000)
+    finally:
+        coordinator.server.server_close()
+
+
+def test_coordinator_rejects_bad_result():
+    coordinator = Coordinator(2, chunk_size=2)
+    try:
+        job = coordinator.next_job()
+        result = {'job_id': job['job_id'], **OutcomeStats().to_dict()}
+        result['n_games'] = 2
+        result['cards_remaining']['counts'] = [0, 0]
+
+        with pytest.raises(ValueError):
+            coordinator.complete_job(result)
+
+        assert coordinator.stats.n_games == 0
+        assert job['job_id'] in coordinator.in_flight
+        assert not coordinator.finished.is_set()
+    finally:
+        coordinator.server.server_close()
+
+
+def test_coordinator_drops_malformed_message():
+    coordinator = Coordinator(2, chunk_size=2)
+    host, port = coordinator.address
+    try:
+        with socket.create_connection((host, port)) as sock, sock.makefile('rw') as conn:
+            server = coordinator.server
+            thread = threading.Thread(target=server.handle_request)
+            thread.start()
+            conn.write('not json\n')
+            conn.write(json.dumps({'type': 'result', 'job_id': 0}) + '\n')
+            conn.flush()
+            replies = [json.loads(conn.readline()) for _ in range(2)]
+            thread.join(timeout=5)
+
+        assert [reply['type'] for reply in replies] == ['job', 'job']
+        assert replies[0]['job_id'] == 0
+        assert coordinator.stats.n_games == 0
+    finally:
+        coordinator.server.server_close()
+
+
+def test_coordinator_checks_params():
+    with pytest.raises(ValueError):
+        Coordinator(2, params={'first_move_selection': 'bogus'})
+    with pytest.raises(ValueError):
+        Coordinator(2, params={'n_cards': 50})
+
+
+def test_coordinator_retries_failed_chunks():
+    coordinator = Coordinator(4, chunk_size=2)
+    try:
+        first = coordinator.next_job()
+        second = coordinator.next_job()
+        result = {'job_id': first['job_id'], **OutcomeStats().to_dict()}
+
+        # an error from a stolen copy of a chunk that is already merged is ignored
+        coordinator.complete_job(result)
+        coordinator.fail_job({'type': 'error', 'job_id': first['job_id'], 'error': 'late'})
+        assert coordinator.error is None
+        assert first['job_id'] not in coordinator.retry
+
+        # a chunk failing on one node goes back to the front of the queue
+        coordinator.fail_job({'type': 'error', 'job_id': second['job_id'], 'error': 'disk full'})
+        assert coordinator.error is None
+        assert not coordinator.finished.is_set()
+        assert coordinator.next_job()['job_id'] == second['job_id']
+
+        coordinator.complete_job({**result, 'job_id': second['job_id']})
+        assert coordinator.finished.is_set()
+        assert coordinator.error is None
+    finally:
+        coordinator.server.server_close()
+
+
+def test_coordinator_stops_on_worker_error():
+    coordinator = Coordinator(4, chunk_size=2, max_failures=2)
+    host, port = coordinator.address
+    run_error = []
+
+    def run():
+        try:
+            coordinator.run(timeout=30)
+        except RuntimeError as e:
+            run_error.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    with socket.create_connection((host, port)) as sock, sock.makefile('rw') as conn:
+        conn.write(json.dumps({'type': 'request'}) + '\n')
+        conn.flush()
+        job = json.loads(conn.readline())
+        conn.write(json.dumps({'type': 'error', 'job_id': job['job_id'], 'error': 'boom'}) + '\n')
+        conn.flush()
+        retried = json.loads(conn.readline())
+        assert retried['job_id'] == job['job_id']
+        conn.write(json.dumps({'type': 'error', 'job_id': job['job_id'], 'error': 'boom'}) + '\n')
+        conn.flush()
+        assert json.loads(conn.readline()) == {'type': 'done'}
+    thread.join(timeout=30)
+
+    assert len(run_error) == 1
+    assert 'boom' in str(run_error[0])
+
+
+def test_run_node_coordinator_goes_away():
+    listener = socket.create_server(('127.0.0.1', 0))
+    host, port = listener.getsockname()[:2]
+
+    def hand_out_job_then_close():
+        conn, _ = listener.accept()
+        with conn, conn.makefile('rw') as f:
+            f.readline()
+            f.write(json.dumps({'type': 'job', 'job_id': 0, 'seed_start': 0, 'n_games': 1}) + '\n')
+            f.flush()
+        listener.close()
+
+    thread = threading.Thread(target=hand_out_job_then_close)
+    thread.start()
+    n_jobs = run_node(host, port)
+    thread.join(timeout=5)
+
+    assert n_jobs == 1
+
+
+def test_coordinator_with_local_workers():
+    params = {'n_players': 2}
+    coordinator = Coordinator(12, seed_start=3, chunk_size=2, params=params)
+    host, port = coordinator.address
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    workers = [
+        subprocess.Popen(
+            [sys.executable, 'sim_cluster.py', 'worker', '--host', host, '--port', str(port)],
+            cwd=repo_root,
+            stdout=subprocess.DEVNULL,
+        )
+        for _ in range(3)
+    ]
+    try:
+        stats = coordinator.run(timeout=60)
+    finally:
+        for worker in workers:
+            worker.wait(timeout=60)
+
+    expected = SimGame(n_games=12, n_players=2, seed=3).run_sim()
+    assert stats.to_dict() == expected.to_dict()
+    assert all(worker.returncode == 0 for worker in workers)
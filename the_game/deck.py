@@ -1,4 +1,5 @@
 import random
+from functools import lru_cache
 from typing import (
     Optional,
 )
@@ -6,10 +7,17 @@ from typing import (
 from .card import Card
 
 
+@lru_cache(maxsize=None)
+def _card_pool(card_range: range):
+    # Card is immutable, so every deck built from the same range can share
+    # one set of instances instead of rebuilding them for each game
+    return tuple(Card(i) for i in card_range)
+
+
 class Deck(object):
 
     def __init__(self, seed: Optional[int] = None, card_range: range = range(2, 100)):
-        self.cards = [Card(i) for i in card_range]
+        self.cards = list(_card_pool(card_range))
         self.seed = seed
 
     def shuffle(self):
@@ -1,4 +1,5 @@
 import json
+import logging
 from random import (
     shuffle,
 )
@@ -93,7 +94,9 @@ class Game(object):
             self.active_player_id = 0
 
     def log_move(self, move: Move):
-        if self.logger is None:
+        # skip building the log body when nothing would be written, it dominates
+        # the cost of a move on long runs
+        if self.logger is None or not self.logger.isEnabledFor(logging.INFO):
             return
         log_body = {
             'game_event': 'move',
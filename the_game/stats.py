@@ -0,0 +1,127 @@
+from typing import (
+    Dict,
+    List,
+    NamedTuple,
+)
+
+
+# a standard deck has 98 cards and every turn plays at least one of them, so
+# neither cards_remaining nor the number of turns in a game can exceed this
+MAX_CARDS = 98
+
+
+class GameOutcome(NamedTuple):
+    game_won: bool
+    cards_remaining: int
+    n_turns: int
+
+    @classmethod
+    def from_game_over(cls, game_over: Dict) -> 'GameOutcome':
+        return cls(game_over['game_won'], game_over['cards_remaining'], game_over['n_turns'])
+
+
+class Histogram(object):
+    """Counts of non-negative integer values in a fixed number of buckets
+
+    Values above max_value all land in the last bucket, so memory use does not
+    depend on how many values are added.
+    """
+
+    def __init__(self, max_value: int = MAX_CARDS):
+        self.max_value = max_value
+        self.counts = [0] * (max_value + 2)
+        self.n = 0
+        self.total = 0
+
+    def add(self, value: int, count: int = 1):
+        self.counts[min(value, self.max_value + 1)] += count
+        self.n += count
+        self.total += value * count
+
+    def merge(self, other: 'Histogram') -> 'Histogram':
+        if other.max_value != self.max_value:
+            raise ValueError("Can only merge histograms with the same max_value")
+        for value, count in enumerate(other.counts):
+            self.counts[value] += count
+        self.n += other.n
+        self.total += other.total
+        return self
+
+    @property
+    def mean(self) -> float:
+        if self.n == 0:
+            return 0.0
+        return self.total / self.n
+
+    def to_list(self) -> List[int]:
+        return list(self.counts)
+
+    def to_dict(self) -> Dict:
+        return {'counts': self.to_list(), 'total': self.total}
+
+    @classmethod
+    def from_dict(cls, body: Dict) -> 'Histogram':
+        hist = cls(len(body['counts']) - 2)
+        hist.counts = list(body['counts'])
+        hist.n = sum(hist.counts)
+        hist.total = body['total']
+        return hist
+
+
+class OutcomeStats(object):
+    """Online aggregate of GameOutcome records that never holds on to the records themselves"""
+
+    def __init__(self, max_value: int = MAX_CARDS):
+        self.n_games = 0
+        self.games_won = 0
+        self.cards_remaining = Histogram(max_value)
+        self.n_turns = Histogram(max_value)
+
+    def add(self, outcome: GameOutcome):
+        self.n_games += 1
+        self.games_won += outcome.game_won
+        self.cards_remaining.add(outcome.cards_remaining)
+        self.n_turns.add(outcome.n_turns)
+
+    def merge(self, other: 'OutcomeStats') -> 'OutcomeStats':
+        # check both histograms before changing anything so a bad merge leaves self intact
+        if (
+            other.cards_remaining.max_value != self.cards_remaining.max_value
+            or other.n_turns.max_value != self.n_turns.max_value
+        ):
+            raise ValueError("Can only merge stats whose histograms have the same max_value")
+        self.n_games += other.n_games
+        self.games_won += other.games_won
+        self.cards_remaining.merge(other.cards_remaining)
+        self.n_turns.merge(other.n_turns)
+        return self
+
+    @property
+    def win_rate(self) -> float:
+        if self.n_games == 0:
+            return 0.0
+        return self.games_won / self.n_games
+
+    def summary(self) -> str:
+        return '\n'.join([
+            f"Won {self.games_won} of {self.n_games} games ({self.win_rate:.2%})",
+            f"Mean cards remaining: {self.cards_remaining.mean:.2f}",
+            f"Mean turns per game: {self.n_turns.mean:.2f}",
+        ])
+
+    def to_dict(self) -> Dict:
+        return {
+            'n_games': self.n_games,
+            'games_won': self.games_won,
+            'cards_remaining': self.cards_remaining.to_dict(),
+            'n_turns': self.n_turns.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, body: Dict) -> 'OutcomeStats':
+        stats = cls()
+        stats.n_games = body['n_games']
+        stats.games_won = body['games_won']
+        stats.cards_remaining = Histogram.from_dict(body['cards_remaining'])
+        stats.n_turns = Histogram.from_dict(body['n_turns'])
+        return stats